@@ -1,56 +1,80 @@
-from typing import AnyStr, Dict, Sequence, Tuple
+import os
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from typing import AnyStr, Dict, Iterator, List, Optional, Sequence, Tuple
 
 import numpy as np
 
 from cloud_array.backends import Backend, get_backend
+from cloud_array.cache import ChunkCache
 from cloud_array.exceptions import CloudArrayException
-from cloud_array.helpers import (chunk2list, collect, compute_index_of_slice, compute_number_of_chunks,
-                                 generate_chunks_slices, get_chunk_slice_by_index, parse_key_to_slices)
+from cloud_array.helpers import (chunk2list, compute_axis_chunks, compute_byte_range, compute_c_strides,
+                                 compute_chunks_bounds, compute_chunks_strides, compute_number_of_chunks,
+                                 generate_chunks_intersections, generate_chunks_slices, get_chunk_slice_by_index,
+                                 parse_key)
+
+RANGE_READ_RATIO = 0.25
+
+DEFAULT_OPTIONS = {
+    "io_concurrency": 32,
+    "decode_concurrency": os.cpu_count() or 1,
+    "chunk_cache_bytes": 512 * 1024 * 1024,
+    "range_read_min_chunk_bytes": 8 * 1024 * 1024,
+}
 
 
 class Chunk:
-    def __init__(self, chunk_number: int, dtype, url: AnyStr, chunk_slice: Tuple[slice], backend: Backend) -> None:
+    __slots__ = ("uri", "chunk_number", "backend", "_slice", "dtype", "cache")
+
+    def __init__(
+        self, chunk_number: int, dtype, url: AnyStr, chunk_slice: Tuple[slice], backend: Backend,
+        cache: ChunkCache = None
+    ) -> None:
         self.uri = url
         self.chunk_number = chunk_number
         self.backend = backend
         self._slice = chunk_slice
         self.dtype = dtype
+        self.cache = cache
 
     @property
     def shape(self):
-        return tuple((s.stop-s.start)//(self.slice.step or 1) for s in self.slice)
-
-    @shape.setter
-    def shape(self, _):
-        raise CloudArrayException("Cannot change value of shape.")
+        return tuple(len(range(s.start, s.stop, s.step or 1)) for s in self._slice)
 
     @property
     def slice(self):
         return self._slice
 
-    @slice.setter
-    def slice(self, _):
-        raise CloudArrayException("Cannot change value of slice")
-
     def save(self, data: np.ndarray) -> None:
-        return self.backend.save_chunk(self.chunk_number, data)
+        try:
+            return self.backend.save_chunk(self.chunk_number, data)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(self.chunk_number)
 
     def __getitem__(self, key: Tuple) -> np.ndarray:
+        if self.cache is not None:
+            return self.cache.read(self.chunk_number, self.backend.read_chunk).__getitem__(key)
         return self.backend.read_chunk(self.chunk_number).__getitem__(key)
 
     def __setitem__(self, key: Tuple, data: np.ndarray) -> None:
-        self.backend.setitem_chunk(self.chunk_number, key, data)
+        try:
+            self.backend.setitem_chunk(self.chunk_number, key, data)
+        finally:
+            if self.cache is not None:
+                self.cache.invalidate(self.chunk_number)
 
 
 class CloudArray:
     def __init__(
         self, chunk_shape: Tuple[int], array: np.ndarray = None,
         shape: Tuple[int] = None, dtype=None, url: AnyStr = None, config={},
-        backend: Backend = None
+        backend: Backend = None, read_dtype=None, store_dtype=None
     ):
         self.chunk_shape = chunk_shape
         self.url = url
         self.array = array
+        self.read_dtype = read_dtype
+        self.store_dtype = store_dtype
         if array is None and dtype is None:
             raise CloudArrayException("Dtype must be defined.")
         if array is None and shape is None:
@@ -58,46 +82,46 @@ class CloudArray:
                 "Shape must be defined by array or shape alone.")
         self._shape = array.shape if array is not None else shape
         self._dtype = array.dtype if array is not None else dtype
-        self._chunks_number = self.count_number_of_chunks(
-            self.shape,
-            self.chunk_shape
-        )
+        self._axis_chunks = np.array(compute_axis_chunks(self.shape, self.chunk_shape), dtype=np.int64)
+        self._axis_chunks.setflags(write=False)
+        self._chunks_number = int(self._axis_chunks.prod())
+        self._strides = compute_chunks_strides(self.shape, self.chunk_shape)
+        self._starts, self._stops = compute_chunks_bounds(self.shape, self.chunk_shape)
+        self._all_chunk_slices: Optional[List[Tuple[slice]]] = None
+        self._metadata_cache = None
+        self._local_metadata_cache = (None, None)
+        self.options = {k: config.get(k, v) for k, v in DEFAULT_OPTIONS.items()}
+        config = {k: v for k, v in config.items() if k not in DEFAULT_OPTIONS}
         self.backend = backend(
             url, config) if backend else get_backend(url, config)
+        self.cache = ChunkCache(self.options["chunk_cache_bytes"])
 
     @property
     def shape(self):
         return self._shape
 
-    @shape.setter
-    def shape(self, _):
-        raise CloudArrayException("Cannot change value of shape.")
-
     @property
     def dtype(self):
         return self._dtype
 
-    @dtype.setter
-    def dtype(self, _):
-        raise CloudArrayException("Cannot change value of dtype.")
-
     @property
     def chunks_number(self):
         return self._chunks_number
 
-    @chunks_number.setter
-    def chunks_number(self, _):
-        raise CloudArrayException("Cannot change value of chunks_number.")
-
     @property
     def metadata(self) -> Dict:
-        return self.backend.read_metadata()
+        if self._metadata_cache is None:
+            self._metadata_cache = self.backend.read_metadata()
+        return self._metadata_cache
 
-    @metadata.setter
-    def metadata(self, _):
-        raise CloudArrayException("Cannot change value of metadata.")
+    def invalidate_metadata(self) -> None:
+        self._metadata_cache = None
 
     def get_metadata(self) -> dict:
+        key = (tuple(self.shape), tuple(self.chunk_shape), str(self.dtype))
+        cached_key, cached = self._local_metadata_cache
+        if cached_key == key:
+            return cached
         result = {
             "chunk_shape": self.chunk_shape,
             "dtype":  str(self.dtype),
@@ -108,14 +132,18 @@ class CloudArray:
                 if dim.stop == self.shape[j]:
                     result["chunks"][i] = chunk2list(chunk)
 
+        self._local_metadata_cache = (key, result)
         return result
 
-    def generate_chunks_slices(self) -> Tuple[slice]:
-        for _slice in generate_chunks_slices(self.shape, self.chunk_shape):
-            yield _slice
+    def generate_chunks_slices(self) -> Iterator[Tuple[slice]]:
+        if self._all_chunk_slices is None:
+            self._all_chunk_slices = list(
+                generate_chunks_slices(self.shape, self.chunk_shape, (self._starts, self._stops))
+            )
+        return iter(self._all_chunk_slices)
 
     def get_chunk_slice_by_index(self, number: int) -> Tuple[slice]:
-        return get_chunk_slice_by_index(self.shape, self.chunk_shape, number)
+        return get_chunk_slice_by_index(self.shape, self.chunk_shape, number, self._strides)
 
     @staticmethod
     def count_number_of_chunks(shape: Tuple[int], chunk_shape: Tuple[int]) -> int:
@@ -125,34 +153,134 @@ class CloudArray:
         chunk_slice = self.get_chunk_slice_by_index(chunk_number)
         return Chunk(
             chunk_number=chunk_number, url=self.url, chunk_slice=chunk_slice,
-            dtype=self.dtype, backend=self.backend
+            dtype=self.dtype, backend=self.backend, cache=self.cache
         )
 
-    def chunks(self) -> Chunk:
-        for i in range(self.chunks_number):
-            yield self.get_chunk(i)
+    def chunks(self) -> Iterator[Chunk]:
+        for i, chunk_slice in enumerate(self.generate_chunks_slices()):
+            yield Chunk(
+                chunk_number=i, url=self.url, chunk_slice=chunk_slice,
+                dtype=self.dtype, backend=self.backend, cache=self.cache
+            )
 
     def save(self, array=None) -> None:
         if array is None and self.array is None:
             raise CloudArrayException("Array is not declared.")
-        array = array or self.array
+        array = array if array is not None else self.array
         metadata = self.get_metadata()
         self.backend.save_metadata(metadata)
+        self.invalidate_metadata()
         for chunk in self.chunks():
-            chunk.save(array[chunk.slice])
+            data = array[chunk.slice]
+            if self.store_dtype is not None:
+                data = data.astype(self.store_dtype, copy=False)
+            chunk.save(data)
+
+    def is_whole_chunk(self, number: int, key: Tuple[slice]) -> bool:
+        return all(k.stop - k.start == s for k, s in zip(key, self.get_chunk_shape(number)))
+
+    def get_chunk_shape(self, number: int) -> Tuple[int]:
+        return tuple(
+            int(stops[i] - starts[i])
+            for starts, stops, i in zip(self._starts, self._stops, self.get_chunk_axis_indices(number))
+        )
 
-    def __getitem__(self, key) -> np.ndarray:
-        new_key = parse_key_to_slices(self.shape, self.chunk_shape, key)
-
-        def _get_chunk_data_by_key(key: Sequence[slice]):
-            idx = compute_index_of_slice(key, self.shape, self.chunk_shape)
-            chunk = self.get_chunk(idx)
-            return chunk[:, :, :]
-
-        dataset = collect(
-            slices=list(new_key),
-            shape=self.shape,
-            chunk_shape=self.chunk_shape,
-            get_items=_get_chunk_data_by_key
+    def get_chunk_axis_indices(self, number: int) -> Tuple[int]:
+        return tuple(number // stride % n for stride, n in zip(self._strides, self._axis_chunks.tolist()))
+
+    def is_small_range(self, number: int, key: Tuple[slice]) -> bool:
+        shape = self.get_chunk_shape(number)
+        itemsize = np.dtype(self.dtype).itemsize
+        nbytes = int(np.prod(shape, dtype=np.int64)) * itemsize
+        if nbytes < self.options["range_read_min_chunk_bytes"]:
+            return False
+        _, length = compute_byte_range(shape, itemsize, key)
+        return length < RANGE_READ_RATIO * nbytes
+
+    def read_chunk_range_into(self, number: int, key: Tuple[slice], dst: np.ndarray) -> None:
+        shape, fortran_order, dtype, offset = self.backend.read_chunk_header(number)
+        if fortran_order or dtype.hasobject or tuple(shape) != self.get_chunk_shape(number):
+            dst[...] = self.read_chunk(number)[key]
+            return
+        start, length = compute_byte_range(shape, dtype.itemsize, key)
+        data = self.backend.read_chunk_range(number, offset + start, length)
+        dst[...] = np.ndarray(
+            shape=tuple(k.stop - k.start for k in key), dtype=dtype, buffer=data,
+            strides=compute_c_strides(shape, dtype.itemsize)
         )
-        return dataset.__getitem__(new_key)
+
+    def read_chunk(self, number: int) -> np.ndarray:
+        return self.cache.read(number, self.backend.read_chunk)
+
+    def read_chunks(self, numbers: Sequence[int]) -> Iterator[Tuple[int, np.ndarray]]:
+        """
+        Reads chunks of given numbers and yields them with their positions in numbers in order of completion.
+        Bytes of chunks are downloaded and decoded by separate pools of threads when backend supports it.
+        """
+        missing = []
+        for i, number in enumerate(numbers):
+            chunk = self.cache.get(number)
+            if chunk is None:
+                missing.append(i)
+            else:
+                yield i, chunk
+        if len(missing) < 2:
+            for i in missing:
+                yield i, self.read_chunk(numbers[i])
+            return
+
+        split = self.backend.supports_chunk_bytes
+        read = self.backend.read_chunk_bytes if split else self.backend.read_chunk
+        io_workers = min(self.options["io_concurrency"], len(missing))
+        decode_workers = min(self.options["decode_concurrency"], len(missing))
+        with ThreadPoolExecutor(io_workers) as io_pool, ThreadPoolExecutor(decode_workers) as decode_pool:
+            pending = {io_pool.submit(read, numbers[i]): (i, not split) for i in missing}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    i, decoded = pending.pop(future)
+                    if decoded:
+                        chunk = future.result()
+                        self.cache.put(numbers[i], chunk)
+                        yield i, chunk
+                    else:
+                        pending[decode_pool.submit(self.backend.decode_chunk, future.result())] = (i, True)
+
+    def __getitem__(self, key) -> np.ndarray:
+        key = parse_key(self.shape, key)
+        intersections = list(generate_chunks_intersections(key, self.chunk_shape, self._strides))
+        result = np.empty(tuple((key[:, 1] - key[:, 0]).tolist()), dtype=self.read_dtype or self.dtype)
+        stored_dtype = np.dtype(self.store_dtype or self.dtype)
+        whole, ranges, parts = [], [], []
+        for intersection in intersections:
+            number, src, dst = intersection
+            if self.cache.get(number) is not None:
+                parts.append(intersection)
+            elif self.is_whole_chunk(number, src):
+                # Only chunks whose destination can be filled in place skip the cache.
+                view = result[dst]
+                if view.flags.c_contiguous and view.dtype == stored_dtype:
+                    whole.append(intersection)
+                else:
+                    parts.append(intersection)
+            elif self.backend.supports_range_reads and self.is_small_range(number, src):
+                ranges.append(intersection)
+            else:
+                parts.append(intersection)
+        max_workers = max(1, min(self.options["io_concurrency"], len(whole) + len(ranges)))
+        with ThreadPoolExecutor(max_workers) as executor:
+            futures = [
+                executor.submit(self.backend.read_chunk_into, number, result[dst])
+                for number, _, dst in whole
+            ] + [
+                executor.submit(self.read_chunk_range_into, number, src, result[dst])
+                for number, src, dst in ranges
+            ]
+            for i, data in self.read_chunks([number for number, _, _ in parts]):
+                _, src, dst = parts[i]
+                result[dst] = data[src]
+            for future in futures:
+                future.result()
+        if np.any(key[:, 2] != 1):
+            return result[tuple(slice(None, None, step) for step in key[:, 2].tolist())]
+        return result
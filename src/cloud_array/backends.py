@@ -6,11 +6,59 @@ from typing import AnyStr, Dict, Tuple
 
 import numpy as np
 
+NPY_HEADER_PROBE = 128
+
+
+def get_npy_header_length(data: memoryview) -> int:
+    """
+    This function computes length of header of .npy file from its first 12 bytes.
+    """
+    if data[6] == 1:
+        return 10 + int.from_bytes(data[8:10], "little")
+    return 12 + int.from_bytes(data[8:12], "little")
+
+
+def parse_npy_header(data: memoryview) -> Tuple[Tuple[int], bool, np.dtype, int]:
+    """
+    This function parses header of .npy file starting at given data.
+    Returns shape, fortran order flag and dtype of array and offset of its data.
+    """
+    offset = get_npy_header_length(data)
+    with io.BytesIO(bytes(data[:offset])) as f:
+        shape, fortran_order, dtype = read_npy_header(f)
+    return shape, fortran_order, dtype, offset
+
+
+def readinto_exact(f, number: int, dst: np.ndarray) -> None:
+    """
+    This function reads data of chunk of given number from file object into C contiguous dst.
+    Raises ValueError when the file ends before dst is filled.
+    """
+    length = f.readinto(dst.data.cast("B"))
+    if length != dst.nbytes:
+        raise ValueError(
+            f"Chunk {number} is truncated, read {length} of {dst.nbytes} bytes of data.")
+
+
+def read_npy_header(f) -> Tuple[Tuple[int], bool, np.dtype]:
+    """
+    This function reads header of .npy file from given file object.
+    Returns shape, fortran order flag and dtype of array and leaves the file at start of its data.
+    """
+    version = np.lib.format.read_magic(f)
+    if version == (1, 0):
+        return np.lib.format.read_array_header_1_0(f)
+    return np.lib.format.read_array_header_2_0(f)
+
 
 class Backend(metaclass=ABCMeta):
+    supports_chunk_bytes = False
+    supports_range_reads = False
+
     def __init__(self, path: AnyStr, config: Dict):
         self.config = config
         self.path = path
+        self.chunk_headers = {}
 
     @abstractmethod
     def save_chunk(self, number: int, chunk: np.ndarray) -> None:
@@ -33,9 +81,38 @@ class Backend(metaclass=ABCMeta):
     def read_metadata(self) -> Dict:
         pass
 
+    def read_chunk_bytes(self, number: int) -> bytes:
+        with io.BytesIO() as f:
+            np.save(f, self.read_chunk(number))
+            return f.getvalue()
+
+    def decode_chunk(self, data: bytes) -> np.ndarray:
+        with io.BytesIO(data) as f:
+            return np.load(f)
+
+    def read_chunk_into(self, number: int, dst: np.ndarray) -> None:
+        dst[...] = self.read_chunk(number)
+
+    def read_chunk_range(self, number: int, offset: int, length: int) -> bytes:
+        return self.read_chunk_bytes(number)[offset:offset + length]
+
+    def read_chunk_header(self, number: int) -> Tuple[Tuple[int], bool, np.dtype, int]:
+        header = self.chunk_headers.get(number)
+        if header is None:
+            data = self.read_chunk_range(number, 0, NPY_HEADER_PROBE)
+            length = get_npy_header_length(memoryview(data))
+            if length > len(data):
+                data = self.read_chunk_range(number, 0, length)
+            header = self.chunk_headers[number] = parse_npy_header(memoryview(data))
+        return header
+
 
 class LocalSystemBackend(Backend):
+    supports_chunk_bytes = True
+    supports_range_reads = True
+
     def save_chunk(self, number: int, chunk: np.ndarray) -> None:
+        self.chunk_headers.pop(number, None)
         directory = os.path.join(self.path, str(number))
         if not os.path.exists(directory):
             os.makedirs(directory)
@@ -51,13 +128,38 @@ class LocalSystemBackend(Backend):
         self.save_chunk(number, data)
 
     def read_chunk(self, number: int) -> np.ndarray:
-        return np.load(
-            os.path.join(
-                self.path,
-                str(number),
-                str(number) + ".npy"
-            ),
-            allow_pickle=True
+        return np.load(self.get_chunk_path(number), allow_pickle=True)
+
+    def read_chunk_bytes(self, number: int) -> bytes:
+        with open(self.get_chunk_path(number), "rb") as f:
+            return f.read()
+
+    def decode_chunk(self, data: bytes) -> np.ndarray:
+        with io.BytesIO(data) as f:
+            return np.load(f, allow_pickle=True)
+
+    def read_chunk_into(self, number: int, dst: np.ndarray) -> None:
+        with open(self.get_chunk_path(number), "rb") as f:
+            shape, fortran_order, dtype = read_npy_header(f)
+            if (
+                dst.flags.c_contiguous and not fortran_order and not dtype.hasobject
+                and dtype == dst.dtype and tuple(shape) == dst.shape
+            ):
+                readinto_exact(f, number, dst)
+                return
+            f.seek(0)
+            dst[...] = np.load(f, allow_pickle=True)
+
+    def read_chunk_range(self, number: int, offset: int, length: int) -> bytes:
+        with open(self.get_chunk_path(number), "rb") as f:
+            f.seek(offset)
+            return f.read(length)
+
+    def get_chunk_path(self, number: int) -> AnyStr:
+        return os.path.join(
+            self.path,
+            str(number),
+            str(number) + ".npy"
         )
 
     def read_metadata(self) -> Dict:
@@ -66,12 +168,16 @@ class LocalSystemBackend(Backend):
 
 
 class S3Backend(Backend):
+    supports_chunk_bytes = True
+    supports_range_reads = True
+
     def __init__(self, path: AnyStr, config: Dict):
         super().__init__(path, config)
         import boto3
         self.client = boto3.client("s3", **config)
 
     def save_chunk(self, number: int, chunk: np.ndarray) -> None:
+        self.chunk_headers.pop(number, None)
         path = os.path.join(
             self.path,
             str(number),
@@ -96,25 +202,46 @@ class S3Backend(Backend):
             Bucket=bucket_name, Key=key, Body=data)
 
     def read_chunk(self, number: int) -> np.ndarray:
+        return self.decode_chunk(self.read_chunk_bytes(number))
+
+    def read_chunk_bytes(self, number: int) -> bytes:
         content = self.get_object(
             os.path.join(
                 str(number),
                 str(number)+".npy"
             )
         )
-        with io.BytesIO(content["Body"].read()) as f:
-            f.seek(0)
-            return np.load(f)
+        return content["Body"].read()
+
+    def read_chunk_into(self, number: int, dst: np.ndarray) -> None:
+        data = self.read_chunk_bytes(number)
+        shape, fortran_order, dtype, offset = parse_npy_header(memoryview(data))
+        if dtype.hasobject:
+            dst[...] = self.decode_chunk(data)
+            return
+        dst[...] = np.frombuffer(
+            data, dtype=dtype, count=int(np.prod(shape, dtype=np.int64)), offset=offset
+        ).reshape(shape, order="F" if fortran_order else "C")
+
+    def read_chunk_range(self, number: int, offset: int, length: int) -> bytes:
+        content = self.get_object(
+            os.path.join(
+                str(number),
+                str(number)+".npy"
+            ),
+            Range=f"bytes={offset}-{offset+length-1}"
+        )
+        return content["Body"].read()
 
     def read_metadata(self) -> Dict:
         content = self.get_object("metadata.json")['Body']
         return json.loads(content.read())
 
-    def get_object(self, key: AnyStr):
+    def get_object(self, key: AnyStr, **kwargs):
         try:
             path = os.path.join(self.path.replace("s3://", ""), key)
             bucket_name, _key = path.split("/", 1)
-            return self.client.get_object(Bucket=bucket_name, Key=_key)
+            return self.client.get_object(Bucket=bucket_name, Key=_key, **kwargs)
         except Exception as e:
             raise Exception(bucket_name, _key) from e
 
@@ -0,0 +1,58 @@
+from collections import OrderedDict
+from threading import Lock
+from typing import Callable, Optional
+
+import numpy as np
+
+
+class ChunkCache:
+    """
+    Least recently used cache of chunks limited by total number of bytes of cached arrays.
+    Cached arrays are made read-only, so they cannot be changed by the caller.
+    """
+
+    def __init__(self, max_bytes: int) -> None:
+        self.max_bytes = max_bytes
+        self.nbytes = 0
+        self._chunks = OrderedDict()
+        self._lock = Lock()
+
+    def get(self, number: int) -> Optional[np.ndarray]:
+        with self._lock:
+            chunk = self._chunks.get(number)
+            if chunk is not None:
+                self._chunks.move_to_end(number)
+            return chunk
+
+    def put(self, number: int, chunk: np.ndarray) -> None:
+        if chunk.nbytes > self.max_bytes:
+            return
+        chunk.setflags(write=False)
+        with self._lock:
+            self._pop(number)
+            self._chunks[number] = chunk
+            self.nbytes += chunk.nbytes
+            while self.nbytes > self.max_bytes:
+                _, evicted = self._chunks.popitem(last=False)
+                self.nbytes -= evicted.nbytes
+
+    def read(self, number: int, read_chunk: Callable[[int], np.ndarray]) -> np.ndarray:
+        chunk = self.get(number)
+        if chunk is None:
+            chunk = read_chunk(number)
+            self.put(number, chunk)
+        return chunk
+
+    def invalidate(self, number: int) -> None:
+        with self._lock:
+            self._pop(number)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._chunks.clear()
+            self.nbytes = 0
+
+    def _pop(self, number: int) -> None:
+        chunk = self._chunks.pop(number, None)
+        if chunk is not None:
+            self.nbytes -= chunk.nbytes
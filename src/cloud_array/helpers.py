@@ -1,9 +1,8 @@
-import operator
-from copy import copy
 from functools import reduce
 from itertools import product
 from math import ceil
-from typing import Callable, List, Sequence, Tuple
+from operator import index as _as_index
+from typing import Iterator, List, Sequence, Tuple
 
 import numpy as np
 
@@ -15,67 +14,66 @@ def compute_number_of_chunks(shape: Tuple[int], chunk_shape: Tuple[int]) -> int:
     This function computes number of chunks required to fit given shape of array and shape of chunk.
     The shape is shape of whole array and chunk_shape is chunk shape.
     """
-    return reduce(operator.mul, map(lambda x: ceil(x[0]/x[1]) or 1, zip(shape, chunk_shape)), 1)
+    return int(np.prod(compute_axis_chunks(shape, chunk_shape), dtype=np.int64))
 
 
-def get_index_of_iter_product(n: int, p: Sequence[Tuple[int]]) -> Tuple[int]:
+def compute_axis_chunks(shape: Tuple[int], chunk_shape: Tuple[int]) -> Tuple[int]:
     """
-    This function computes value of product of ranges for given n.
-    The p is a sequence of range arguments start, stop, step.
+    This function computes number of chunks along each axis of array.
     """
-    _p = [ceil((stop-start)/step) for start, stop, step in p]
-    result = []
-    for i in range(len(_p)-1, 0, -1):
-        r = n % _p[i]
-        result.append((r+p[i][0])*p[i][2])
-        n = (n-r)//_p[i]
-    result.append((n+p[0][0])*p[0][2])
-    return tuple(result[::-1])
-
-
-def compute_index_of_slice(slice: Sequence[slice], shape: Tuple[int], chunk_shape: Tuple[int]) -> int:
-    m = [1] + [ceil(i/j) for i, j in zip(shape[::-1], chunk_shape[::-1])][:-1]
-    m = [i*j for i, j in zip(m, [1]+m[:-1])]
-    x = [i.start // j*k for i, j, k in zip(slice[::-1], chunk_shape[::-1], m)]
-    return sum(x)
-
-
-def collect(
-    slices: Sequence[slice],
-    shape: Sequence[int],
-    chunk_shape: Sequence[int],
-    get_items: Callable,
-    level: int = 0,
-) -> np.ndarray:
-    p: np.ndarray = None
-    if level < len(slices):
-        num_of_pieces = ceil(slices[level].stop / chunk_shape[level])
-
-        for i in range(num_of_pieces):
-            _slices = copy(slices)
-            start = i * chunk_shape[level]
-
-            if i == num_of_pieces - 1:
-                stop = shape[level]
-            else:
-                stop = (i + 1) * chunk_shape[level]
-
-            _slices[level] = slice(start, stop)
-
-            q: np.ndarray = collect(
-                slices=_slices,
-                level=level + 1,
-                shape=shape,
-                chunk_shape=chunk_shape,
-                get_items=get_items
-            )
-            if p is None:
-                p = q
-                continue
-            p = np.concatenate((p, q), axis=level)
-        return p
-    else:
-        return get_items(slices)
+    return tuple(ceil(s/c) or 1 for s, c in zip(shape, chunk_shape))
+
+
+def compute_chunks_strides(shape: Tuple[int], chunk_shape: Tuple[int]) -> Tuple[int]:
+    """
+    This function computes strides of the grid of chunks in C order.
+    The stride of an axis is the distance between numbers of neighbouring chunks along that axis.
+    """
+    axis_chunks = np.array(compute_axis_chunks(shape, chunk_shape)[1:], dtype=np.int64)
+    return tuple(np.cumprod(axis_chunks[::-1])[::-1].tolist()) + (1,)
+
+
+def generate_chunks_intersections(
+    key: np.ndarray, chunk_shape: Sequence[int], strides: Sequence[int]
+) -> Iterator[Tuple[int, Tuple[slice], Tuple[slice]]]:
+    """
+    This function generates intersections of given key with chunks overlapping it.
+    The key is an array of starts, stops and steps returned by parse_key.
+    Every intersection is a number of chunk, slice of the chunk and slice of the result of given key.
+    The strides are strides of the grid of chunks.
+    """
+    _chunk_shape = np.array(chunk_shape, dtype=np.int64)
+    first = key[:, 0] // _chunk_shape
+    last = -(-key[:, 1] // _chunk_shape)
+    numbers, src, dst = [], [], []
+    for j in range(len(chunk_shape)):
+        index = np.arange(first[j], last[j])
+        offsets = index * _chunk_shape[j]
+        starts = np.maximum(offsets, key[j, 0])
+        stops = np.minimum(offsets + _chunk_shape[j], key[j, 1])
+        numbers.append(index * strides[j])
+        src.append([slice(*i) for i in zip((starts - offsets).tolist(), (stops - offsets).tolist())])
+        dst.append([slice(*i) for i in zip((starts - key[j, 0]).tolist(), (stops - key[j, 0]).tolist())])
+    numbers = reduce(np.add.outer, numbers).ravel().tolist()
+    return zip(numbers, product(*src), product(*dst))
+
+
+def compute_c_strides(shape: Sequence[int], itemsize: int) -> Tuple[int]:
+    """
+    This function computes strides in bytes of C ordered array of given shape and itemsize.
+    """
+    return tuple((np.cumprod((tuple(shape[1:]) + (1,))[::-1])[::-1] * itemsize).tolist())
+
+
+def compute_byte_range(shape: Sequence[int], itemsize: int, key: Sequence[slice]) -> Tuple[int, int]:
+    """
+    This function computes offset and length of the smallest range of bytes of C ordered array
+    of given shape and itemsize containing all elements selected by given key.
+    """
+    strides = compute_c_strides(shape, itemsize)
+    first = sum(k.start * s for k, s in zip(key, strides))
+    last = sum((k.stop - 1) * s for k, s in zip(key, strides))
+    return first, last - first + itemsize
 
 
 def chunk2list(chunk: Tuple[slice]) -> List[List[int]]:
@@ -86,63 +84,93 @@ def list2chunk(_list: List[List[int]]) -> Tuple[slice]:
     return tuple([slice(*el) for el in _list])
 
 
-def generate_chunks_slices(shape: Sequence[int], chunk_shape: Sequence[int]) -> Tuple[slice]:
-    _ranges = (
-        range(0, a, c)
-        for c, a in zip(chunk_shape, shape)
-    )
-    p = product(*_ranges)
-    for i in p:
-        yield tuple(
-            slice(
-                i[j],
-                min(shape[j], i[j]+chunk_shape[j])
-            )
-            for j in range(len(shape))
-        )
-
-
-def get_chunk_slice_by_index(shape: Sequence[int], chunk_shape: Sequence[int], number: int) -> Tuple[slice]:
-    p = tuple((0, a, c) for c, a in zip(chunk_shape, shape))
-    val = get_index_of_iter_product(number, p)
-    return tuple(
-        slice(
-            val[j],
-            min(shape[j], val[j]+chunk_shape[j])
-        )
-        for j in range(len(shape))
+def compute_chunks_bounds(
+    shape: Sequence[int], chunk_shape: Sequence[int]
+) -> Tuple[List[np.ndarray], List[np.ndarray]]:
+    """
+    This function computes starts and stops of chunks along each axis of array.
+    """
+    starts = [np.arange(0, s, c) for s, c in zip(shape, chunk_shape)]
+    stops = [np.minimum(start+c, s) for start, c, s in zip(starts, chunk_shape, shape)]
+    return starts, stops
+
+
+def generate_chunks_slices(
+    shape: Sequence[int], chunk_shape: Sequence[int],
+    bounds: Tuple[List[np.ndarray], List[np.ndarray]] = None
+) -> Tuple[slice]:
+    """
+    This function generates slices of all chunks in C order.
+    The bounds are starts and stops of chunks along each axis, computed from shape and chunk_shape when not given.
+    """
+    starts, stops = bounds or compute_chunks_bounds(shape, chunk_shape)
+    _slices = (
+        [slice(start, stop) for start, stop in zip(_starts.tolist(), _stops.tolist())]
+        for _starts, _stops in zip(starts, stops)
     )
+    return product(*_slices)
 
 
-def parse_key_to_slices(shape: Sequence[int], chunk_shape: Sequence[int], key: Tuple[slice]):
+def get_chunk_slice_by_index(
+    shape: Sequence[int], chunk_shape: Sequence[int], number: int, strides: Sequence[int] = None
+) -> Tuple[slice]:
+    """
+    This function decodes number of chunk into its slice.
+    The strides are strides of the grid of chunks, computed from shape and chunk_shape when not given.
+    """
+    if strides is None:
+        strides = compute_chunks_strides(shape, chunk_shape)
     result = []
-    for i in range(len(key)):
-        val = key[i]
-        if isinstance(val, int):
-            if val < 0:
-                val = shape[i] + val
-            result.append(
-                slice(val, val+1)
-            )
-        else:
-            start = val.start or 0
-            stop = val.stop or shape[i]
-            if start > shape[i] or stop > shape[i]:
-                raise CloudArrayException(
-                    f"Slice {key[i]} does not fit shape: {shape}.")
-            if start >= stop:
-                raise CloudArrayException(
-                    f"Key invalid slice {key[i]}. Start >= stop.")
-            if start < 0:
-                start = shape[i] + start
-            if stop < 0:
-                stop = shape[i] + stop
-
-            result.append(
-                slice(
-                    start,
-                    stop,
-                    val.step if val.step else 1
-                )
-            )
+    for s, c, stride in zip(shape, chunk_shape, strides):
+        idx, number = divmod(number, stride)
+        start = idx*c
+        result.append(slice(start, min(start+c, s)))
     return tuple(result)
+
+
+def parse_key(shape: Sequence[int], key) -> np.ndarray:
+    """
+    This function normalizes key of array of given shape into an array of shape (ndim, 3).
+    Every row of the result is start, stop and step of the key along an axis.
+    Missing trailing axes are taken whole and integer indexes are kept as slices of length one.
+    """
+    if not isinstance(key, tuple):
+        key = (key,)
+    if len(key) > len(shape):
+        raise CloudArrayException(f"Key {key} has more dimensions than shape: {shape}.")
+    _shape = np.array(shape, dtype=np.int64)
+    result = np.empty((len(shape), 3), dtype=np.int64)
+    result[:, 0] = 0
+    result[:, 1] = _shape
+    result[:, 2] = 1
+    is_int = np.zeros(len(shape), dtype=bool)
+    for i, val in enumerate(key):
+        try:
+            result[i, 0] = _as_index(val)
+            is_int[i] = True
+        except TypeError:
+            if val.start is not None:
+                result[i, 0] = val.start
+            if val.stop is not None:
+                result[i, 1] = val.stop
+            if val.step is not None:
+                result[i, 2] = val.step
+    result[:, :2] += np.where(result[:, :2] < 0, _shape[:, None], 0)
+    result[is_int, 1] = result[is_int, 0] + 1
+
+    invalid = (result[:, 0] < 0) | (result[:, 1] > _shape)
+    if np.any(invalid):
+        i = np.flatnonzero(invalid)[0]
+        raise CloudArrayException(
+            f"Slice {key[i] if i < len(key) else slice(None)} does not fit shape: {shape}.")
+    invalid = result[:, 0] >= result[:, 1]
+    if np.any(invalid):
+        i = np.flatnonzero(invalid)[0]
+        raise CloudArrayException(
+            f"Key invalid slice {key[i] if i < len(key) else slice(None)}. Start >= stop.")
+    invalid = result[:, 2] <= 0
+    if np.any(invalid):
+        i = np.flatnonzero(invalid)[0]
+        raise CloudArrayException(
+            f"Key invalid slice {key[i]}. Step must be positive.")
+    return result
@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from cloud_array.exceptions import CloudArrayException
+from cloud_array.helpers import (compute_byte_range, compute_number_of_chunks, generate_chunks_slices,
+                                 get_chunk_slice_by_index, parse_key)
+
+
+@pytest.mark.parametrize("shape,chunk_shape", [
+    ((251, 126, 51), (16, 16, 16)),
+    ((7, 3), (7, 1)),
+    ((5,), (2,)),
+])
+def test_get_chunk_slice_by_index(shape, chunk_shape):
+    slices = list(generate_chunks_slices(shape, chunk_shape))
+    assert len(slices) == compute_number_of_chunks(shape, chunk_shape)
+    for i, _slice in enumerate(slices):
+        assert get_chunk_slice_by_index(shape, chunk_shape, i) == _slice
+
+
+@pytest.mark.parametrize("key,expected", [
+    ((slice(2, 5), 3), [[2, 5, 1], [3, 4, 1], [0, 6, 1]]),
+    ((slice(-3, None, 2), -1, slice(None, -2)), [[7, 10, 2], [7, 8, 1], [0, 4, 1]]),
+    (slice(None, None), [[0, 10, 1], [0, 8, 1], [0, 6, 1]]),
+    ((np.int64(4), np.array(-2)), [[4, 5, 1], [6, 7, 1], [0, 6, 1]]),
+])
+def test_parse_key(key, expected):
+    assert parse_key((10, 8, 6), key).tolist() == expected
+
+
+@pytest.mark.parametrize("key", [
+    (slice(0, 11),),
+    (slice(5, 5),),
+    (slice(2, 5, -1),),
+    (slice(0, 10, 0),),
+    (slice(None), slice(None), slice(None), slice(None)),
+])
+def test_parse_key_invalid(key):
+    with pytest.raises(CloudArrayException):
+        parse_key((10, 8, 6), key)
+
+
+@pytest.mark.parametrize("key", [
+    (slice(2, 3), slice(1, 4), slice(0, 5)),
+    (slice(0, 4), slice(0, 6), slice(0, 5)),
+    (slice(3, 4), slice(5, 6), slice(4, 5)),
+])
+def test_compute_byte_range(key):
+    shape = (4, 6, 5)
+    data = np.arange(np.prod(shape), dtype=np.int32).reshape(shape)
+    offset, length = compute_byte_range(shape, data.itemsize, key)
+    selected = data[key].ravel()
+    assert offset == selected[0] * data.itemsize
+    assert length == (selected[-1] - selected[0] + 1) * data.itemsize
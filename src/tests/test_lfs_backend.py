@@ -1,10 +1,16 @@
+import os
+
 import numpy as np
 import pytest
 
+from cloud_array import CloudArray
+from cloud_array.backends import Backend, LocalSystemBackend
+
 
 @pytest.mark.parametrize("key", [
     (slice(10, 64), slice(17, 52), slice(17, 32)),
     (slice(10, 12), slice(10, 12), slice(10, 12)),
+    (slice(40, 251), slice(100, 126, 3), slice(33, 50)),
     (slice(None, None), slice(None, None), slice(None, None)),
 ])
 def test_lfs_getitem(key, test_data, lfs_array):
@@ -13,3 +19,167 @@ def test_lfs_getitem(key, test_data, lfs_array):
         test_data[key],
         lfs_array[key]
     )
+
+
+def test_lfs_metadata_is_cached(lfs_array):
+    metadata = lfs_array.metadata
+    assert metadata["dtype"] == str(lfs_array.dtype)
+    assert lfs_array.metadata is metadata
+    lfs_array.invalidate_metadata()
+    assert lfs_array.metadata is not metadata
+    assert lfs_array.metadata == metadata
+
+
+@pytest.mark.parametrize("key", [
+    (slice(3, 40), slice(5, 17)),
+    (slice(None, None), slice(None, None)),
+])
+def test_lfs_getitem_2d(key, tmp_path):
+    data = np.random.rand(45, 19)
+    array = CloudArray(chunk_shape=(8, 6), url=str(tmp_path), array=data)
+    array.save()
+    assert np.array_equal(data[key], array[key])
+
+
+def test_lfs_chunk_cache(tmp_path):
+    data = np.random.rand(20, 20)
+    array = CloudArray(chunk_shape=(10, 10), url=str(tmp_path), array=data)
+    array.save()
+    assert np.array_equal(data, array[:, :])
+    assert np.array_equal(data[1:19, 1:19], array[1:19, 1:19])
+    assert array.cache.nbytes == data.nbytes
+    for number in range(array.chunks_number):
+        chunk = array.cache.get(number)
+        assert chunk.base is None or chunk.base.nbytes == chunk.nbytes
+    assert np.array_equal(data, array[:, :])
+
+    chunk = array.get_chunk(0)
+    with pytest.raises(ValueError):
+        chunk[...][0, 0] = 1.0
+    chunk[0:1, 0:1] = np.ones((1, 1))
+    assert array.cache.nbytes == data.nbytes - data[:10, :10].nbytes
+    assert array[0:1, 0:1][0, 0] == 1.0
+
+
+def test_lfs_whole_chunks_read_in_place(tmp_path):
+    data = np.random.rand(20, 20)
+    array = CloudArray(chunk_shape=(5, 20), url=str(tmp_path), array=data)
+    array.save()
+    assert np.array_equal(data[5:15], array[5:15])
+    assert array.cache.nbytes == 0
+    assert np.array_equal(data[:, :10], array[:, :10])
+    assert array.cache.nbytes == data.nbytes
+
+
+def test_lfs_chunk(lfs_array):
+    chunk = lfs_array.get_chunk(lfs_array.chunks_number - 1)
+    assert chunk.shape == (11, 14, 3)
+    assert chunk.slice == (slice(240, 251), slice(112, 126), slice(48, 51))
+    for number, _slice in enumerate(lfs_array.generate_chunks_slices()):
+        assert lfs_array.get_chunk_shape(number) == tuple(s.stop - s.start for s in _slice)
+    with pytest.raises(AttributeError):
+        chunk.shape = (1, 1, 1)
+
+
+def test_lfs_read_and_store_dtype(tmp_path):
+    data = np.random.rand(20, 20)
+    array = CloudArray(
+        chunk_shape=(8, 8), url=str(tmp_path), array=data, store_dtype=np.float16, read_dtype=np.float32
+    )
+    array.save()
+    result = array[2:18, :]
+    assert result.dtype == np.float32
+    assert np.array_equal(result, data[2:18, :].astype(np.float16).astype(np.float32))
+
+
+@pytest.mark.parametrize("name", ["shape", "dtype", "chunks_number", "metadata"])
+def test_lfs_read_only_properties(name, lfs_array):
+    with pytest.raises(AttributeError):
+        setattr(lfs_array, name, None)
+
+
+def test_lfs_truncated_chunk(tmp_path):
+    data = np.random.rand(20, 20)
+    array = CloudArray(chunk_shape=(10, 10), url=str(tmp_path), array=data)
+    array.save()
+    path = array.backend.get_chunk_path(0)
+    with open(path, "rb+") as f:
+        f.truncate(os.path.getsize(path) - 400)
+    with pytest.raises(ValueError):
+        array[0:10, 0:10]
+    with pytest.raises(ValueError):
+        array[1:19, 1:19]
+
+
+def test_lfs_small_chunks_are_cached_instead_of_range_read(tmp_path):
+    data = np.random.rand(16, 16, 16)
+    array = CloudArray(chunk_shape=(16, 16, 16), url=str(tmp_path), array=data)
+    array.save()
+    for i in range(3):
+        assert np.array_equal(data[i:i+1, 2:14, 2:14], array[i:i+1, 2:14, 2:14])
+    assert array.cache.nbytes == data.nbytes
+    assert array.backend.chunk_headers == {}
+
+
+def test_lfs_range_reads(tmp_path):
+    data = np.random.rand(16, 16, 16)
+    array = CloudArray(
+        chunk_shape=(16, 16, 16), url=str(tmp_path), array=data, config={"range_read_min_chunk_bytes": 0}
+    )
+    array.save()
+    for i in range(3):
+        assert np.array_equal(data[i:i+1, 2:14, 2:14], array[i:i+1, 2:14, 2:14])
+    assert array.cache.nbytes == 0
+    assert list(array.backend.chunk_headers) == [0]
+
+
+@pytest.mark.parametrize("chunk_bytes", [True, False])
+def test_lfs_read_chunks_with_pools(chunk_bytes, tmp_path):
+    class Backend(LocalSystemBackend):
+        supports_chunk_bytes = chunk_bytes
+
+    data = np.random.rand(40, 30, 20)
+    array = CloudArray(
+        chunk_shape=(8, 8, 8), url=str(tmp_path), array=data, backend=Backend,
+        config={"io_concurrency": 3, "decode_concurrency": 2}
+    )
+    array.save()
+    key = (slice(3, 37), slice(1, 29, 2), slice(5, 19))
+    assert np.array_equal(data[key], array[key])
+    assert array.cache.nbytes > 0
+    assert np.array_equal(data[key], array[key])
+
+
+def test_lfs_chunk_save_invalidates_cache_after_write(tmp_path):
+    class Backend(LocalSystemBackend):
+        def save_chunk(self, number, chunk):
+            if os.path.exists(self.get_chunk_path(number)):
+                array.read_chunk(number)
+            super().save_chunk(number, chunk)
+
+    data = np.random.rand(10, 10)
+    array = CloudArray(chunk_shape=(10, 10), url=str(tmp_path), array=data, backend=Backend)
+    array.save()
+    array.get_chunk(0).save(np.ones((10, 10)))
+    assert np.array_equal(array[2:8, 2:8], np.ones((6, 6)))
+    array.get_chunk(0)[0:1, 0:1] = np.zeros((1, 1))
+    assert array[0:1, 0:1][0, 0] == 0.0
+
+
+def test_backend_default_chunk_reads(tmp_path):
+    class DefaultsBackend(LocalSystemBackend):
+        read_chunk_bytes = Backend.read_chunk_bytes
+        decode_chunk = Backend.decode_chunk
+        read_chunk_into = Backend.read_chunk_into
+        read_chunk_range = Backend.read_chunk_range
+
+    data = np.random.rand(30, 30)
+    array = CloudArray(
+        chunk_shape=(10, 10), url=str(tmp_path), array=data, backend=DefaultsBackend,
+        config={"range_read_min_chunk_bytes": 0}
+    )
+    array.save()
+    assert array.backend.read_chunk_header(0)[:3] == ((10, 10), False, data.dtype)
+    assert np.array_equal(data[12:14, 12:18], array[12:14, 12:18])
+    assert array.cache.nbytes == 0
+    assert np.array_equal(data, array[:, :])